@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- encoding:utf-8 -*-
+
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+import mtable
+
+
+def make_files(path, count, rows):
+    html_row = '<tr><td>%d</td><td>host-%d.example.com</td><td>中文 %d</td></tr>'
+    md_row = '| %d | host-%d.example.com | 中文 %d |'
+    paths = []
+    for n in range(count):
+        if n % 2:
+            filename = os.path.join(path, 'page%04d.html' % n)
+            text = '<html><body><table>\n<tr><th>id</th><th>host</th><th>note</th></tr>\n'
+            text += '\n'.join(html_row % (i, i, i) for i in range(rows))
+            text += '\n</table></body></html>\n'
+        else:
+            filename = os.path.join(path, 'page%04d.md' % n)
+            text = '| id | host | note |\n|----|------|------|\n'
+            text += '\n'.join(md_row % (i, i, i) for i in range(rows)) + '\n'
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+        paths.append(filename)
+    return paths
+
+
+def bench_convert_many(count=64, rows=300):
+    print('''
+convert_many: %s files, %s rows
+-------------------------------''' % (count, rows))
+    with tempfile.TemporaryDirectory() as path:
+        paths = make_files(path, count, rows)
+        base = None
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            start = time.perf_counter()
+            results = mtable.convert_many(paths, to='rst', workers=workers)
+            elapsed = time.perf_counter() - start
+            assert not any(r.error for r in results)
+            base = base or elapsed
+            print('workers %2d: %.3fs  speedup %.2fx' % (workers, elapsed, base / elapsed))
+            workers *= 2
+
+
+def make_csv(rows):
+    random.seed(0)
+    status = ['200', '301', '404', '500']
+    hosts = ['host-%d.example.com' % i for i in range(20)]
+    countries = ['中国', 'United States', 'Deutschland', '日本', 'France']
+    lines = ['id,status,host,country']
+    for i in range(rows):
+        lines.append('%d,%s,%s,%s' % (
+            i, random.choice(status), random.choice(hosts), random.choice(countries)))
+    return '\n'.join(lines) + '\n'
+
+
+def bench_encode(rows=100000):
+    print('''
+dictionary encoded columns: %s rows
+-----------------------------------''' % rows)
+    text = make_csv(rows)
+    for encode in (None, 0.5):
+        tracemalloc.start()
+        table = mtable.MarkupTable.from_csv(io.StringIO(text), encode=encode)
+        memory, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        start = time.perf_counter()
+        table.to_rst()
+        elapsed = time.perf_counter() - start
+        print('encode %-4s: %6.1f MB  peak %6.1f MB  to_rst %.3fs  encoded columns %s' % (
+            encode, memory / 1024 / 1024, peak / 1024 / 1024, elapsed,
+            sorted(table._shared_columns)))
+
+
+def bench_estimate(rows=100000, sample=1000):
+    print('''
+sampled column widths: %s rows, sample %s
+-----------------------------------------''' % (rows, sample))
+    text = make_csv(rows)
+    for sample_rows in (None, sample):
+        stats = {}
+        start = time.perf_counter()
+        lines = mtable.iter_convert(
+            text, 'csv', 'rst', sample=sample_rows, overflow='truncate', stats=stats)
+        next(lines)
+        first = time.perf_counter() - start
+        for line in lines:
+            pass
+        print('stream sample %-5s: first line %.3fs  total %.3fs  overflow %s' % (
+            sample_rows, first, time.perf_counter() - start, stats.get('overflow', 0)))
+
+    table = mtable.MarkupTable.from_csv(io.StringIO(text))
+    for sample_rows in (None, sample):
+        table.estimate_widths(sample_rows, reservoir=sample, overflow='truncate')
+        start = time.perf_counter()
+        table.to_rst()
+        print('to_rst sample %-5s: %.3fs  overflow %s' % (
+            sample_rows, time.perf_counter() - start, table.overflow_count()))
+
+
+if __name__ == '__main__':
+    bench_convert_many(*[int(v) for v in sys.argv[1:]])
+    bench_encode()
+    bench_estimate()
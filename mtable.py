@@ -1,12 +1,25 @@
 #!/usr/bin/env python
 # -*- encoding:utf-8 -*-
 
+import io
+import os
 import re
+import sys
 import csv
 import json
+import types
+import argparse
+import contextlib
+import functools
+import itertools
+import time
+import random
+import hashlib
+import collections
+import concurrent.futures
 
 from bs4 import BeautifulSoup
-from wcwidth import wcswidth
+from wcwidth import wcswidth, wcwidth
 
 
 VERSION = '0.2.22'
@@ -18,6 +31,8 @@ AlignSymbol = {
     'right': '>',
 }
 
+OverflowPolicy = ('overflow', 'truncate', 'widen')
+
 CjkRange = (  # UTF-8
     (0x2E80, 0x9FC3),
     (0xAC00, 0xD7A3),
@@ -28,10 +43,55 @@ CjkRange = (  # UTF-8
 )
 
 
+def _render_str(value):
+    return '%s' % value
+
+
+def truncate_text(text, width, marker='…'):
+    """cut text to display width, end with marker
+    """
+    width -= wcswidth(marker)
+    chars = []
+    for ch in text:
+        w = max(wcwidth(ch), 0)
+        if width - w < 0:
+            break
+        width -= w
+        chars.append(ch)
+    return ''.join(chars) + marker
+
+
+def _reflow(to_func):
+    """render again when overflow='widen' widened columns of table
+
+    Separator lines are built before cells, the second output measures
+    all cells.
+    """
+    @functools.wraps(to_func)
+    def wrapper(self, *args, **kwargs):
+        text = to_func(self, *args, **kwargs)
+        estimate = self._estimate
+        if estimate is None or estimate['overflow'] != 'widen' \
+                or not self._overflow_cells:
+            return text
+        overflow_cells = self._overflow_cells
+        self._estimate = None
+        try:
+            return to_func(self, *args, **kwargs)
+        finally:
+            self._estimate = estimate
+            self._overflow_cells = overflow_cells
+    return wrapper
+
+
 class MarkupTable(object):
     _header = None
     _data = None
     _columns_width = None
+    _shared_columns = frozenset()  # columns whose cells are shared by rows
+    _estimate = None
+    _overflow_cells = 0
+    _rules = ()
     _left_padding = ' '
     _right_padding = ' '
     _null_char = '--'
@@ -48,34 +108,31 @@ class MarkupTable(object):
         self._header = header
         self._footer = footer
         self._data = []
+        self._shared_columns = set()
+        self._rules = []
+        self._rules_cache = {}
+        self._text_cache = {}  # padded text of shared cells
 
         if data:
             for rows in data:
-                row_data = []
-                for cell in rows:
-                    row_data.append({
-                        'data': cell,
-                        'render': lambda x: '%s' % x,
-                        'align': 'left',
-                        'MB': 0,  # cell width
-                    })
-                self._data.append(row_data)
+                self._data.append([self._new_cell(cell) for cell in rows])
 
     def __repr__(self):
         return '<Markup Table: %s rows, %s cols>' % (
             self.row_count(), self.column_count()
         )
 
+    @staticmethod
+    def _new_cell(value):
+        return {
+            'data': value,
+            'render': _render_str,
+            'align': 'left',
+            'MB': 0,  # cell width
+        }
+
     def append_row(self, row):
-        row_data = []
-        for value in row:
-            row_data.append({
-                'data': value,
-                'render': lambda x: '%s' % x,
-                'align': 'left',
-                'MB': 0,  # cell width
-            })
-        self._data.append(row_data)
+        self._data.append([self._new_cell(value) for value in row])
 
     def append_rows(self, rows):
         for row in rows:
@@ -85,6 +142,8 @@ class MarkupTable(object):
         self._header = 0
         self._footer = 0
         self._data = []
+        self._shared_columns = set()
+        self.clear_rules()
 
     def row_count(self):
         return 0 if self.is_empty() else len(self._data)
@@ -98,21 +157,425 @@ class MarkupTable(object):
     def is_invalid(self):
         return False
 
+    def _column_index(self, column):
+        if isinstance(column, int):
+            return column
+        for row in range(self._header):
+            for index, cell in enumerate(self._data[row]):
+                if cell['data'] == column:
+                    return index
+        raise ValueError('column "%s" is not found in header' % column)
+
+    @staticmethod
+    def _stack_tables(tables):
+        """return class of result and tables, freeze tables if any is frozen
+        """
+        if any(isinstance(t, FrozenTable) for t in tables):
+            return FrozenTable, [t.freeze() for t in tables]
+        return MarkupTable, tables
+
+    @staticmethod
+    def vstack(tables):
+        """stack rows of tables
+
+        Header rows of the first table with header are kept, header rows of
+        other tables are dropped. Rows and cells are shared with tables, not
+        copied, format rules are moved to the new rows. Stacking FrozenTable
+        returns FrozenTable, its widths come from the widths of tables.
+        """
+        tables = [t for t in tables if not t.is_empty()]
+        cls, tables = MarkupTable._stack_tables(tables)
+        if not tables:
+            return MarkupTable()
+        column_count = tables[0].column_count()
+        for t in tables:
+            if t.column_count() != column_count:
+                raise ValueError('column count mismatch: %s != %s' % (
+                    t.column_count(), column_count))
+        header_table = None
+        for t in tables:
+            if t._header > 0:
+                header_table = t
+                break
+        if header_table is None:
+            header = 0
+            data = []
+        else:
+            header = header_table._header
+            data = list(header_table._data[:header])
+        for t in tables:
+            data.extend(t._data[t._header:])
+
+        if cls is FrozenTable:
+            widths = [0] * column_count
+            for t in tables:
+                if t is header_table:
+                    t_widths = t._columns_width
+                else:
+                    t_widths = t._body_widths()
+                widths = [max(a, b) for a, b in zip(widths, t_widths)]
+            return FrozenTable._create(header, data, widths)
+        mt = MarkupTable(header=header)
+        mt._data = data
+        offset = header
+        for t in tables:
+            mt._shared_columns.update(t._shared_columns)
+            row_moves = [(t._header, t.row_count(), offset - t._header)]
+            if t is header_table:
+                row_moves.append((0, header, 0))
+            mt._rules.extend(t._moved_rules(row_moves=row_moves))
+            offset += t.row_count() - t._header
+        return mt
+
+    @staticmethod
+    def hstack(tables):
+        """put columns of tables side by side
+
+        Header rows are aligned, missing header cells are blank and missing
+        data cells are None. Cells are shared with tables, not copied.
+        """
+        tables = [t for t in tables if not t.is_empty()]
+        cls, tables = MarkupTable._stack_tables(tables)
+        if not tables:
+            return MarkupTable()
+        header = max(t._header for t in tables)
+        body = max(t.row_count() - t._header for t in tables)
+        data = []
+        padded = set()
+        for row in range(header + body):
+            row_data = []
+            for t in tables:
+                if row < header:
+                    value = ''
+                    index = row if row < t._header else None
+                else:
+                    value = None
+                    index = t._header + row - header
+                    if index >= t.row_count():
+                        index = None
+                if index is None:
+                    row_data.extend(
+                        cls._new_cell(value) for _ in range(t.column_count()))
+                    if value is None:
+                        padded.add(id(t))
+                else:
+                    row_data.extend(t._data[index])
+            data.append(row_data)
+
+        if cls is FrozenTable:
+            widths = []
+            for t in tables:
+                if id(t) in padded:
+                    null_width = len(t._null_char)
+                    widths.extend(max(w, null_width) for w in t._columns_width)
+                else:
+                    widths.extend(t._columns_width)
+            return FrozenTable._create(header, data, widths)
+        mt = MarkupTable(header=header)
+        mt._data = data
+        offset = 0
+        for t in tables:
+            mt._shared_columns.update(offset + c for c in t._shared_columns)
+            mt._rules.extend(t._moved_rules(
+                row_moves=[(0, t._header, 0),
+                           (t._header, t.row_count(), header - t._header)],
+                column_moves=[(0, t.column_count(), offset)]))
+            offset += t.column_count()
+        return mt
+
+    def join(self, other, on=0, how='inner'):
+        """join rows of other which have the same value in column on
+
+        on: column index or header name in both tables
+        how: inner or left. left keeps rows without match, filled with None
+        Cells are shared with both tables, not copied.
+        """
+        if how not in ('inner', 'left'):
+            raise ValueError('unknown join: %s' % how)
+        cls, (table, other) = MarkupTable._stack_tables([self, other])
+        key = table._column_index(on)
+        other_key = other._column_index(on)
+
+        index = {}
+        for row_index in range(other._header, other.row_count()):
+            row = other._data[row_index]
+            index.setdefault(row[other_key]['data'], []).append((
+                row_index,
+                [cell for column, cell in enumerate(row) if column != other_key]))
+
+        other_count = max(other.column_count() - 1, 0)
+        header = max(table._header, other._header)
+        data = []
+        # source row in table and other of each new row
+        sources = []
+        other_sources = []
+        for row in range(header):
+            sources.append(row if row < table._header else None)
+            other_sources.append(row if row < other._header else None)
+            if row < table._header:
+                row_data = list(table._data[row])
+            else:
+                row_data = [cls._new_cell('') for _ in range(table.column_count())]
+            if row < other._header:
+                row_data.extend(cell for column, cell in enumerate(other._data[row])
+                                if column != other_key)
+            else:
+                row_data.extend(cls._new_cell('') for _ in range(other_count))
+            data.append(row_data)
+        used = set()
+        left_shared = right_shared = False
+        for row_index in range(table._header, table.row_count()):
+            row = table._data[row_index]
+            matches = index.get(row[key]['data'])
+            if matches:
+                # rows repeated by join share their cells
+                left_shared = left_shared or len(matches) > 1
+                right_shared = right_shared or id(matches) in used
+                used.add(id(matches))
+                for other_index, match in matches:
+                    data.append(list(row) + match)
+                    sources.append(row_index)
+                    other_sources.append(other_index)
+            elif how == 'left':
+                data.append(list(row) + [
+                    cls._new_cell(None) for _ in range(other_count)])
+                sources.append(row_index)
+                other_sources.append(None)
+
+        if cls is FrozenTable:
+            return FrozenTable._create(header, data)
+        mt = MarkupTable(header=header)
+        mt._data = data
+        mt._shared_columns.update(table._shared_columns)
+        if left_shared:
+            mt._shared_columns.update(range(table.column_count()))
+        other_columns = [c for c in range(other.column_count()) if c != other_key]
+        for index, column in enumerate(other_columns):
+            if right_shared or column in other._shared_columns:
+                mt._shared_columns.add(table.column_count() + index)
+        mt._rules.extend(table._moved_rules(row_sources=sources))
+        mt._rules.extend(other._moved_rules(
+            row_sources=other_sources,
+            column_moves=[
+                (0, other_key, table.column_count()),
+                (other_key + 1, other.column_count(), table.column_count() - 1)]))
+        return mt
+
+    @staticmethod
+    def _move_index(index, start, stop, delta):
+        """indexes of index in [start, stop) moved by delta
+        """
+        if index is None:
+            index = range(start, stop)
+        if isinstance(index, range):
+            first = index.start
+            if first < start:
+                first += -(-(start - first) // index.step) * index.step
+            return range(first + delta, min(index.stop, stop) + delta, index.step)
+        return frozenset(i + delta for i in index if start <= i < stop)
+
+    def _moved_rules(self, row_moves=None, column_moves=None, row_sources=None):
+        """rules of this table for rows and columns in a new table
+
+        row_moves, column_moves: list of (start, stop, delta), indexes in
+        [start, stop) are moved by delta. None keeps indexes.
+        row_sources: source row in this table of each new row, or None
+        """
+        rules = []
+        for rule in self._rules:
+            if row_sources is not None:
+                rows = rule['rows']
+                if rows is not None:
+                    rows = frozenset(
+                        new_row for new_row, row in enumerate(row_sources)
+                        if row is not None and row in rows)
+                rows_list = [rows]
+            elif row_moves is not None:
+                rows_list = [self._move_index(rule['rows'], *move)
+                             for move in row_moves]
+            else:
+                rows_list = [rule['rows']]
+            if column_moves is not None:
+                columns_list = [self._move_index(rule['columns'], *move)
+                                for move in column_moves]
+            else:
+                columns_list = [rule['columns']]
+            for rows in rows_list:
+                if rows is not None and not rows:
+                    continue
+                for columns in columns_list:
+                    if columns is not None and not columns:
+                        continue
+                    rules.append(dict(rule, rows=rows, columns=columns))
+        return rules
+
+    @staticmethod
+    def _encode_key(cell):
+        # 1, 1.0 and True are equal keys without type
+        value = cell['data']
+        return (type(value), value, cell['render'], cell['align'])
+
+    def encode(self, ratio=0.5, columns=None):
+        """share one cell among data rows with the same value
+
+        A column is encoded when its unique values / data rows <= ratio, its
+        rows then refer to one cell of each unique value. Width and cell
+        text of a shared cell are calculated once unless format rules of
+        the column depend on row.
+        return encoded columns
+        """
+        rows = self._data[self._header:]
+        if columns is None:
+            columns = range(self.column_count())
+        elif isinstance(columns, int):
+            columns = [columns]
+        encoded = []
+        for column in columns:
+            cells = {}
+            try:
+                for row in rows:
+                    cell = row[column]
+                    cells.setdefault(self._encode_key(cell), cell)
+            except TypeError:
+                # unhashable data
+                continue
+            if len(cells) > ratio * len(rows):
+                continue
+            for row in rows:
+                row[column] = cells[self._encode_key(row[column])]
+            self._shared_columns.add(column)
+            encoded.append(column)
+        if encoded:
+            self._text_cache = {}
+        return encoded
+
+    def _append_encoded(self, rows, ratio, window=1000):
+        """append rows and share cells of same value while reading them
+
+        Columns are decided on the first window rows as encode does, cells
+        of other columns are copied apart and not shared any more.
+        """
+        start = len(self._data)
+        cells = []
+        count = 0
+        for row in rows:
+            if len(row) > len(cells):
+                cells.extend({} for _ in range(len(row) - len(cells)))
+            data = []
+            for column, value in enumerate(row):
+                shared = cells[column]
+                if shared is None:
+                    data.append(self._new_cell(value))
+                    continue
+                key = (type(value), value)
+                cell = shared.get(key)
+                if cell is None:
+                    cell = shared[key] = self._new_cell(value)
+                data.append(cell)
+            self._data.append(data)
+            count += 1
+            if count == window:
+                self._decide_encoded(cells, ratio, count, start)
+        if count < window:
+            self._decide_encoded(cells, ratio, count, start)
+        self._text_cache = {}
+
+    def _decide_encoded(self, cells, ratio, count, start):
+        for column, shared in enumerate(cells):
+            if shared is None or column in self._shared_columns:
+                continue
+            if len(shared) <= ratio * count:
+                self._shared_columns.add(column)
+                continue
+            cells[column] = None
+            for row in self._data[start:]:
+                if column < len(row):
+                    row[column] = dict(row[column])
+
+    def freeze(self):
+        """return immutable FrozenTable of current data, format and align
+
+        Widths are calculated once, a FrozenTable can be rendered by many
+        threads at the same time.
+        """
+        return FrozenTable(self)
+
     def _calc_widths(self):
+        if self._estimate is not None:
+            return self._calc_sample_widths()
         self._columns_width = [0] * self.column_count()
         for column in range(self.column_count()):
+            shared = self._is_shared(column)
+            measured = set()
             # data
             for row in range(self.row_count()):
                 cell = self.get_cell(row, column)
+                if shared:
+                    # measure shared cell once
+                    if id(cell) in measured:
+                        continue
+                    measured.add(id(cell))
                 text = self.render_data(row, column)
-                mb = self.cjk_count(text)
-                w = wcswidth(text)
-                if w < 1:
-                    w = len(text) + mb
+                w, mb = self.text_width(text)
                 self._columns_width[column] = max(w, self._columns_width[column])
                 cell['MB'] = mb
         return self._columns_width
 
+    def _calc_sample_widths(self):
+        sample = self._estimate['sample']
+        reservoir = self._estimate['reservoir']
+        rows = list(range(min(self._header + sample, self.row_count())))
+        rest = range(len(rows), self.row_count())
+        rows.extend(random.Random(self._estimate['seed']).sample(
+            rest, min(reservoir, len(rest))))
+
+        self._overflow_cells = 0
+        self._columns_width = [0] * self.column_count()
+        for row in rows:
+            for column in range(self.column_count()):
+                text = self.render_data(row, column)
+                w, mb = self.text_width(text)
+                self._columns_width[column] = max(w, self._columns_width[column])
+        return self._columns_width
+
+    def estimate_widths(self, sample=1000, reservoir=1000, overflow='overflow',
+                        seed=None):
+        """column widths from header, first sample rows and reservoir random rows
+
+        Output starts without measuring all rows. Wider cells are rendered
+        by overflow policy:
+            overflow: write whole text
+            truncate: cut text and end with marker
+            widen: use the wider column, to_txt, to_rst and to_md render
+                   again with widths of all cells
+        overflow_count() returns overflowed cells of last output.
+        sample None to measure all rows again.
+        """
+        if overflow not in OverflowPolicy:
+            raise ValueError('unknown overflow policy: %s' % overflow)
+        if sample is None:
+            self._estimate = None
+        else:
+            self._estimate = {
+                'sample': sample,
+                'reservoir': reservoir,
+                'overflow': overflow,
+                'seed': seed,
+            }
+
+    def overflow_count(self):
+        return self._overflow_cells
+
+    @classmethod
+    def text_width(cls, text):
+        """return (display width, CJK count) of text
+        """
+        mb = cls.cjk_count(text)
+        w = wcswidth(text)
+        if w < 1:
+            w = len(text) + mb
+        return w, mb
+
     @staticmethod
     def cjk_count(text):
         count = 0
@@ -129,34 +592,113 @@ class MarkupTable(object):
     def set_align(self, align, rows=None, columns=None):
         """align: left, right, center
         """
-        if rows is None:
-            rows = range(self.row_count())
-        elif isinstance(rows, int):
-            rows = [rows]
-
-        if columns is None:
-            columns = range(self.column_count())
-        elif isinstance(columns, int):
-            columns = [columns]
-
-        for row in rows:
-            for column in columns:
-                self._data[row][column]['align'] = align
+        self.add_rule(align=align, rows=rows, columns=columns)
 
     def set_format(self, render_func, rows=None, columns=None):
         """set render function of cell
         """
-        if rows is None:
-            rows = range(self.row_count())
-        elif isinstance(rows, int):
-            rows = [rows]
-        if columns is None:
-            columns = range(self.column_count())
-        elif isinstance(columns, int):
-            columns = [columns]
-        for row in rows:
-            for column in columns:
-                self._data[row][column]['render'] = render_func
+        self.add_rule(render=render_func, rows=rows, columns=columns)
+
+    @staticmethod
+    def _rule_index(value, count, name, check=True):
+        """rows or columns of rule, negative index counts from count
+
+        A range of positive step is kept as is to cover rows appended later.
+        """
+        if value is None:
+            return None
+        if isinstance(value, range) and value.step > 0 and value.start >= 0:
+            return value
+        if isinstance(value, int):
+            value = [value]
+        index = set()
+        for i in value:
+            if i < 0:
+                i += count
+            if check and not 0 <= i < count:
+                raise IndexError('%s index out of range' % name)
+            index.add(i)
+        return frozenset(index)
+
+    def add_rule(self, render=None, align=None, style=None,
+                 rows=None, columns=None, when=None):
+        """format cells when they are rendered
+
+        rows, columns: int, range or list, None for all, also rows appended
+        later. Negative index counts from the end of current rows or columns
+        when: function of cell data, the rule is used when it returns True.
+        TypeError and ValueError are taken as False.
+        render: render function, align: left, right, center,
+        style: css style of html cell
+        Later rules override earlier rules.
+        """
+        self._rules.append({
+            'rows': self._rule_index(rows, self.row_count(), 'row'),
+            'columns': self._rule_index(
+                columns, self.column_count(), 'column', not self.is_empty()),
+            'when': when,
+            'render': render,
+            'align': align,
+            'style': style,
+        })
+        self._rules_cache = {}
+        self._text_cache = {}
+
+    def clear_rules(self):
+        self._rules = []
+        self._rules_cache = {}
+        self._text_cache = {}
+
+    def _column_rules(self, column):
+        """return (rules of column, format of all rows or None)
+        """
+        rules = self._rules_cache.get(column)
+        if rules is None:
+            rules = [rule for rule in self._rules
+                     if rule['columns'] is None or column in rule['columns']]
+            fixed = None
+            if all(rule['rows'] is None and rule['when'] is None for rule in rules):
+                fixed = {}
+                for rule in rules:
+                    for key in ('render', 'align', 'style'):
+                        if rule[key] is not None:
+                            fixed[key] = rule[key]
+            rules = self._rules_cache[column] = (rules, fixed)
+        return rules
+
+    def _cell_format(self, row, column):
+        """return (render, align, style) of cell
+        """
+        cell = self.get_cell(row, column)
+        render = cell['render']
+        align = cell['align']
+        style = cell.get('style')
+        if not self._rules:
+            return render, align, style
+        rules, fixed = self._column_rules(column)
+        if fixed is not None:
+            return (fixed.get('render', render), fixed.get('align', align),
+                    fixed.get('style', style))
+        for rule in rules:
+            if rule['rows'] is not None and row not in rule['rows']:
+                continue
+            if rule['when'] is not None:
+                try:
+                    if not rule['when'](cell['data']):
+                        continue
+                except (TypeError, ValueError):
+                    continue
+            render = rule['render'] or render
+            align = rule['align'] or align
+            style = rule['style'] or style
+        return render, align, style
+
+    def _is_shared(self, column):
+        """cells of column are shared and formatted same in all rows
+        """
+        if column not in self._shared_columns:
+            return False
+        return not self._rules or self._column_rules(column)[1] is not None
 
     def render_data(self, row, column):
         """render data
@@ -166,25 +708,58 @@ class MarkupTable(object):
         if value is None:
             text = self._null_char
         else:
-            render_func = cell.get('render')
+            render_func = self._cell_format(row, column)[0]
             text = render_func(value)
         return text
 
     def render_cell(self, row, column):
         """render cell
         """
+        if self._estimate is not None:
+            return self._render_estimated_cell(row, column)
         cell = self.get_cell(row, column)
-        align = cell.get('align')
+        shared = self._is_shared(column)
+        if shared:
+            # shared cells may be in other tables, cache text in this table
+            key = (column, id(cell))
+            cache = self._text_cache.get(key)
+            if cache and cache[0] == self._columns_width[column]:
+                return cache[1]
+        render_func, align, style = self._cell_format(row, column)
         align = AlignSymbol.get(align)
 
-        text = self.render_data(row, column)
+        value = cell['data']
+        text = self._null_char if value is None else render_func(value)
 
-        width = self._columns_width[column] - cell['MB']
-        if width > 0:
-            cell_text = '{:{align}{width}}'.format(text, align=align, width=width)
-            return cell_text
+        if column in self._shared_columns and not shared:
+            # MB of shared cell is from other row
+            mb = self.cjk_count(text)
         else:
-            return text
+            mb = cell['MB']
+        width = self._columns_width[column] - mb
+        if width > 0:
+            text = '{:{align}{width}}'.format(text, align=align, width=width)
+        if shared:
+            self._text_cache[key] = (self._columns_width[column], text)
+        return text
+
+    def _render_estimated_cell(self, row, column):
+        align = AlignSymbol.get(self._cell_format(row, column)[1])
+        text = self.render_data(row, column)
+        w, mb = self.text_width(text)
+        width = self._columns_width[column]
+        if w > width:
+            self._overflow_cells += 1
+            overflow = self._estimate['overflow']
+            if overflow == 'truncate':
+                text = truncate_text(text, width)
+                w, mb = self.text_width(text)
+            elif overflow == 'widen':
+                self._columns_width[column] = width = w
+        width -= mb
+        if width > 0:
+            text = '{:{align}{width}}'.format(text, align=align, width=width)
+        return text
 
     # def from_dataframe(self, df, encoding='utf-8'):
     #     for h in df.columns:
@@ -214,7 +789,10 @@ class MarkupTable(object):
     #     return mt
 
     @staticmethod
-    def from_rst(rst_text):
+    def from_rst(rst_text, cache=None):
+        if cache is not None:
+            return cache.tables('rst', rst_text, MarkupTable.from_rst)
+
         def parse_table1(text):
             header = 0
             data = []
@@ -272,7 +850,10 @@ class MarkupTable(object):
         return tables
 
     @staticmethod
-    def from_md(md_text):
+    def from_md(md_text, cache=None):
+        if cache is not None:
+            return cache.tables('md', md_text, MarkupTable.from_md)
+
         def parse_table(text):
             header = 0
             data = []
@@ -303,17 +884,33 @@ class MarkupTable(object):
         return tables
 
     @staticmethod
-    def from_csv(fobj, header=True):
+    def from_csv(fobj, header=True, encode=None):
+        """encode: ratio to encode low cardinality columns, see encode.
+        Cells are shared while reading rows, columns are decided on the
+        first 1000 rows.
+        """
         mt = MarkupTable()
         reader = csv.reader(fobj)
         if header:
             mt.append_row(reader.__next__())
-        for row in reader:
-            mt.append_row(row)
+        if encode:
+            mt._append_encoded(reader, encode)
+        else:
+            for row in reader:
+                mt.append_row(row)
         return mt
 
     @staticmethod
-    def from_html(html_text):
+    def from_html(html_text, cache=None, encode=None):
+        """encode: ratio to encode low cardinality columns, see encode
+        """
+        if cache is not None:
+            tables = cache.tables('html', html_text, MarkupTable.from_html)
+            if encode:
+                for mt in tables:
+                    mt.encode(encode)
+            return tables
+
         def strip_text(text):
             text = text.replace('\r\n', ' ')
             text = text.replace('\r', ' ')
@@ -323,10 +920,7 @@ class MarkupTable(object):
                 text = text.replace('  ', ' ')
             return text
 
-        tables = []
-        soup = BeautifulSoup(html_text, 'html5lib')
-        for table in soup.find_all('table'):
-            mt = MarkupTable()
+        def iter_rows(table):
             column_count = 0
             for tr in table.find_all('tr'):
                 row = []
@@ -340,10 +934,22 @@ class MarkupTable(object):
                         column_count = len(row)
                     diff = column_count - len(row)
                     row.extend([None] * diff)
-                mt.append_row(row)
+                yield row
+
+        tables = []
+        soup = BeautifulSoup(html_text, 'html5lib')
+        for table in soup.find_all('table'):
+            mt = MarkupTable()
+            rows = iter_rows(table)
+            if encode:
+                mt._append_encoded(rows, encode)
+            else:
+                for row in rows:
+                    mt.append_row(row)
             tables.append(mt)
         return tables
 
+    @_reflow
     def to_txt(self, simple=True):
         h_sep = '-'
         d_sep = '-'
@@ -409,6 +1015,7 @@ class MarkupTable(object):
             t.append(''.join(th_s))
         return '\n'.join(t) + '\n'
 
+    @_reflow
     def to_rst(self, simple=True):
         """two styles: False or True
         """
@@ -487,6 +1094,7 @@ class MarkupTable(object):
             t.append(''.join(th_s))
         return '\n'.join(t) + '\n'
 
+    @_reflow
     def to_md(self, footer=False):
         if self.is_empty() or self.is_invalid():
             return ''
@@ -522,6 +1130,13 @@ class MarkupTable(object):
         #     t.append(t[0])
         return '\n'.join(t) + '\n'
 
+    def _html_cell(self, tag, row, column):
+        text = self.render_data(row, column)
+        style = self._cell_format(row, column)[2]
+        if style:
+            return '<%s style="%s">%s</%s>' % (tag, style, text, tag)
+        return '<%s>%s</%s>' % (tag, text, tag)
+
     def to_html(self, filename=None, full=False, encoding=None):
         if self.is_empty() or self.is_invalid():
             return ''
@@ -541,13 +1156,13 @@ class MarkupTable(object):
             for h in range(self._header):
                 html.append('<tr>')
                 for column in range(self.column_count()):
-                    html.append('<th>%s</th>' % self.render_data(h, column))
+                    html.append(self._html_cell('th', h, column))
                 html.append('</tr>')
         # data
         for row in range(self._header, self.row_count()):
             html.append('<tr>')
             for column in range(self.column_count()):
-                html.append('<td>%s</td>' % self.render_data(row, column))
+                html.append(self._html_cell('td', row, column))
             html.append('</tr>')
         html.append('</table>')
         if full:
@@ -558,6 +1173,11 @@ class MarkupTable(object):
         else:
             print('\n'.join(html) + '\n')
 
+    def to_list(self):
+        """return raw data of all rows
+        """
+        return [[cell['data'] for cell in row] for row in self._data]
+
     def to_tab(self):
         if self.is_empty() or self.is_invalid():
             return ''
@@ -613,3 +1233,806 @@ class MarkupTable(object):
             return pd.DataFrame.from_records(data[1:], columns=data[0])
         else:
             return pd.DataFrame.from_records(data)
+
+
+Readers = ('csv', 'md', 'rst', 'html')
+Writers = ('txt', 'rst', 'md', 'html', 'csv', 'json', 'tab')
+
+Extensions = {
+    '.csv': 'csv',
+    '.md': 'md',
+    '.rst': 'rst',
+    '.htm': 'html',
+    '.html': 'html',
+}
+
+
+class FrozenTable(MarkupTable):
+    """immutable snapshot of MarkupTable
+
+    Cell text, CJK count and column widths are calculated when freezing,
+    rendering only reads them.
+    """
+    def __init__(self, table):
+        data = []
+        widths = [0] * table.column_count()
+        frozen_cells = {}
+        for row in range(table.row_count()):
+            row_data = []
+            for column in range(table.column_count()):
+                cell = table.get_cell(row, column)
+                shared = table._is_shared(column)
+                if shared:
+                    frozen = frozen_cells.get(id(cell))
+                    if frozen is not None:
+                        row_data.append(frozen)
+                        continue
+                text = table.render_data(row, column)
+                w, mb = self.text_width(text)
+                widths[column] = max(w, widths[column])
+                render, align, style = table._cell_format(row, column)
+                frozen = types.MappingProxyType({
+                    'data': cell['data'],
+                    'render': render,
+                    'align': align,
+                    'style': style,
+                    'MB': mb,
+                    'width': w,
+                    'text': text,
+                })
+                if shared:
+                    frozen_cells[id(cell)] = frozen
+                row_data.append(frozen)
+            data.append(tuple(row_data))
+        self._init(table._header, table._footer, data, widths)
+
+    def _init(self, header, footer, data, widths):
+        object.__setattr__(self, '_header', header)
+        object.__setattr__(self, '_footer', footer)
+        object.__setattr__(self, '_data', tuple(tuple(row) for row in data))
+        object.__setattr__(self, '_columns_width', tuple(widths))
+
+    @classmethod
+    def _create(cls, header, data, widths=None):
+        """FrozenTable of frozen cells, widths default from cell widths
+        """
+        if widths is None:
+            widths = [0] * (len(data[0]) if data else 0)
+            for row in data:
+                for column, cell in enumerate(row):
+                    widths[column] = max(widths[column], cell['width'])
+        mt = cls.__new__(cls)
+        mt._init(header, 0, data, widths)
+        return mt
+
+    @classmethod
+    def _new_cell(cls, value):
+        text = cls._null_char if value is None else '%s' % value
+        w, mb = cls.text_width(text)
+        return types.MappingProxyType({
+            'data': value,
+            'render': _render_str,
+            'align': 'left',
+            'style': None,
+            'MB': mb,
+            'width': w,
+            'text': text,
+        })
+
+    def _body_widths(self):
+        """column widths without header rows
+        """
+        widths = self._columns_width
+        if all(cell['width'] < widths[column]
+               for row in self._data[:self._header]
+               for column, cell in enumerate(row)):
+            return widths
+        body_widths = [0] * len(widths)
+        for row in self._data[self._header:]:
+            for column, cell in enumerate(row):
+                body_widths[column] = max(body_widths[column], cell['width'])
+        return body_widths
+
+    def __repr__(self):
+        return '<Frozen Markup Table: %s rows, %s cols>' % (
+            self.row_count(), self.column_count()
+        )
+
+    def __setattr__(self, name, value):
+        raise TypeError('FrozenTable is immutable')
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('FrozenTable is immutable')
+
+    append_row = append_rows = clearall = _immutable
+    set_align = set_format = add_rule = clear_rules = encode = _immutable
+
+    def freeze(self):
+        return self
+
+    def _calc_widths(self):
+        return self._columns_width
+
+    def render_data(self, row, column):
+        return self._data[row][column]['text']
+
+    def render_cell(self, row, column):
+        cell = self._data[row][column]
+        width = self._columns_width[column] - cell['MB']
+        if width > 0:
+            return '{:{align}{width}}'.format(
+                cell['text'], align=AlignSymbol.get(cell['align']), width=width)
+        return cell['text']
+
+
+class ParseCache(object):
+    """cache of tables parsed by from_rst, from_md and from_html
+
+    Tables are keyed by sha256 of the input text and parser. The latest
+    maxsize documents are kept in memory, and with path also in files
+    under path, oldest used files are removed when they exceed max_bytes.
+
+    cache = ParseCache(path='.mtable_cache')
+    tables = MarkupTable.from_rst(text, cache=cache)
+    """
+    def __init__(self, maxsize=128, path=None, max_bytes=64 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._disk_size = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def __repr__(self):
+        return '<Parse Cache: %s hits, %s misses>' % (self.hits, self.misses)
+
+    def __getstate__(self):
+        # memory entries stay in this process, other processes share files
+        state = self.__dict__.copy()
+        state['_memory'] = collections.OrderedDict()
+        state['_disk_size'] = None
+        return state
+
+    @staticmethod
+    def make_key(fmt, text):
+        h = hashlib.sha256()
+        h.update(('%s:%s:' % (VERSION, fmt)).encode('utf-8'))
+        h.update(text.encode('utf-8', 'surrogatepass'))
+        return h.hexdigest()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self._memory),
+            'disk_bytes': self._disk_usage() if self.path else 0,
+        }
+
+    def clear(self):
+        self._memory.clear()
+        if self.path:
+            for filename in self._disk_files():
+                os.remove(filename)
+            self._disk_size = 0
+
+    def tables(self, fmt, text, parse_func):
+        """return tables of text, call parse_func(text) if not cached
+        """
+        key = self.make_key(fmt, text)
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            tables = parse_func(text)
+            self.set(key, [(mt.to_list(), mt._header) for mt in tables])
+            return tables
+        self.hits += 1
+        return [MarkupTable(data, header=header) for data, header in value]
+
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            return value
+        if not self.path:
+            return None
+        filename = os.path.join(self.path, key + '.json')
+        try:
+            with open(filename, 'rt', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # broken file, may be removed by other process already
+            try:
+                size = os.path.getsize(filename)
+                os.remove(filename)
+            except FileNotFoundError:
+                return None
+            if self._disk_size is not None:
+                self._disk_size -= size
+            return None
+        self.disk_hits += 1
+        self._set_memory(key, value)
+        return value
+
+    def set(self, key, value):
+        self._set_memory(key, value)
+        if not self.path:
+            return
+        filename = os.path.join(self.path, key + '.json')
+        tmp_filename = '%s.%s.tmp' % (filename, os.getpid())
+        size = self._disk_usage()
+        try:
+            size -= os.path.getsize(filename)
+        except FileNotFoundError:
+            pass
+        with open(tmp_filename, 'wt', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+        self._disk_size = size + os.path.getsize(filename)
+        if self._disk_size > self.max_bytes:
+            self._evict()
+
+    def _set_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _disk_files(self):
+        return [os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.endswith('.json')]
+
+    def _disk_usage(self):
+        if self._disk_size is None:
+            self._disk_size = sum(
+                os.path.getsize(filename) for filename in self._disk_files())
+        return self._disk_size
+
+    def _evict(self):
+        files = []
+        for filename in self._disk_files():
+            try:
+                st = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, filename))
+        files.sort()
+        size = sum(f[1] for f in files)
+        for mtime, file_size, filename in files:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._disk_size = size
+
+
+def read_tables(src, from_, cache=None):
+    """yield (rows, header) for every table of src
+
+    src is text or a file object. csv rows are read lazily, other formats
+    need the whole document to find tables.
+    cache: ParseCache for md, rst and html
+    """
+    if from_ == 'csv':
+        if isinstance(src, str):
+            src = io.StringIO(src)
+        yield csv.reader(src), 1
+        return
+    if not isinstance(src, str):
+        src = src.read()
+    if from_ == 'md':
+        tables = MarkupTable.from_md(src, cache=cache)
+    elif from_ == 'rst':
+        tables = MarkupTable.from_rst(src, cache=cache)
+    elif from_ == 'html':
+        tables = MarkupTable.from_html(src, cache=cache)
+    else:
+        raise ValueError('unknown input format: %s' % from_)
+    for mt in tables:
+        rows = ([cell['data'] for cell in row] for row in mt._data)
+        yield rows, mt._header
+
+
+def _render_text(value, null_char):
+    return null_char if value is None else '%s' % value
+
+
+def _iter_grid(rows, to, header, widths, align, simple, null_char,
+               sample, overflow, stats):
+    if overflow not in OverflowPolicy:
+        raise ValueError('unknown overflow policy: %s' % overflow)
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    rows = itertools.chain([first], rows)
+    # cells may be wider than widths from sample or given widths
+    check = widths is not None or sample is not None
+    if widths is None:
+        if sample is None:
+            # column widths need the whole table
+            measured = rows = [
+                [_render_text(v, null_char) for v in row] for row in rows]
+        else:
+            measured = [[_render_text(v, null_char) for v in row]
+                        for row in itertools.islice(rows, header + sample)]
+            rows = itertools.chain(measured, rows)
+        widths = [0] * max(len(row) for row in measured)
+        null_width = MarkupTable.text_width(null_char)[0]
+        for row in measured:
+            for column, text in enumerate(row):
+                widths[column] = max(widths[column], MarkupTable.text_width(text)[0])
+            # short rows are padded with null_char
+            for column in range(len(row), len(widths)):
+                widths[column] = max(widths[column], null_width)
+    elif isinstance(widths, int):
+        widths = [widths] * len(first)
+    else:
+        widths = list(widths)
+        if len(widths) != len(first):
+            raise ValueError('%s widths for %s columns' % (len(widths), len(first)))
+    overflow_cells = 0
+    column_count = len(widths)
+    if align is None or isinstance(align, str):
+        align = [align or 'left'] * column_count
+    align = [AlignSymbol.get(a, '<') for a in align]
+    align.extend(['<'] * (column_count - len(align)))
+    left = MarkupTable._left_padding
+    right = MarkupTable._right_padding
+    pad = len(left) + len(right)
+
+    if to == 'md':
+        v_separator = '|'
+        th_s = v_separator + ''.join(
+            left + '-' * w + right + v_separator for w in widths)
+        tr_s = None
+    else:
+        h_sep = '=' if to == 'rst' else '-'
+        if to == 'rst' and simple:
+            v_separator = c_separator = ' '
+            lead = ''
+        else:
+            v_separator = '|'
+            c_separator = '+'
+            lead = c_separator
+        th_s = lead + ''.join(h_sep * (w + pad) + c_separator for w in widths)
+        tr_s = lead + ''.join('-' * (w + pad) + c_separator for w in widths)
+    v_lead = '' if to == 'rst' and simple else v_separator
+
+    def render_row(row):
+        nonlocal overflow_cells
+        tr = [v_lead]
+        if len(row) > column_count:
+            raise ValueError('row has %s columns, more than %s' % (
+                len(row), column_count))
+        row = list(row)
+        row.extend([None] * (column_count - len(row)))
+        for column, value in enumerate(row):
+            text = _render_text(value, null_char)
+            if check:
+                w, mb = MarkupTable.text_width(text)
+                if w > widths[column]:
+                    overflow_cells += 1
+                    if overflow == 'truncate':
+                        text = truncate_text(text, widths[column])
+                        mb = MarkupTable.cjk_count(text)
+                    elif overflow == 'widen':
+                        widths[column] = w
+            else:
+                mb = MarkupTable.cjk_count(text)
+            width = widths[column] - mb
+            if width > 0:
+                text = '{:{align}{width}}'.format(
+                    text, align=align[column], width=width)
+            tr.append(left)
+            tr.append(text)
+            tr.append(right)
+            tr.append(v_separator)
+        return ''.join(tr)
+
+    rows = iter(rows)
+    head = list(itertools.islice(rows, header))
+    if to == 'md':
+        for row in head:
+            yield render_row(row)
+        yield th_s
+    else:
+        for row in head:
+            yield th_s if simple else tr_s
+            yield render_row(row)
+        if head:
+            yield th_s
+        else:
+            yield th_s if simple else tr_s
+    for row in rows:
+        yield render_row(row)
+        if to != 'md' and not simple:
+            yield tr_s
+    if to != 'md' and simple:
+        yield th_s
+    if stats is not None:
+        stats['overflow'] = stats.get('overflow', 0) + overflow_cells
+
+
+def render_rows(rows, to='rst', header=0, widths=None, align=None,
+                simple=True, full=False, null_char='--',
+                sample=None, overflow='overflow', stats=None):
+    """render rows of raw values, line by line
+
+    widths: int or list of column widths. txt, rst and md must read all
+    rows to measure widths unless widths or sample is given; other formats
+    and fixed widths consume rows one at a time.
+    align: left, right, center or list of them for each column
+    sample: measure widths from header and first sample rows only
+    overflow: overflow, truncate or widen for cells wider than column,
+    see MarkupTable.estimate_widths
+    stats: dict, 'overflow' is added by count of overflowed cells
+    """
+    if to in ('txt', 'rst', 'md'):
+        yield from _iter_grid(
+            rows, to, header, widths, align, simple, null_char,
+            sample, overflow, stats)
+    elif to == 'html':
+        if full:
+            yield '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8" />
+<title>Markup Table</title>
+</head>
+<body>'''
+        yield '<table>'
+        for index, row in enumerate(rows):
+            tag = 'th' if index < header else 'td'
+            yield '<tr>'
+            for value in row:
+                yield '<%s>%s</%s>' % (tag, _render_text(value, null_char), tag)
+            yield '</tr>'
+        yield '</table>'
+        if full:
+            yield '</body></html>'
+    elif to == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(
+            buf, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL,
+            lineterminator='')
+        for row in rows:
+            writer.writerow([_render_text(v, null_char) for v in row])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    elif to == 'tab':
+        for row in rows:
+            yield '\t'.join(_render_text(v, null_char) for v in row)
+    elif to == 'json':
+        yield '['
+        prev = None
+        for row in rows:
+            if prev is not None:
+                yield '    %s,' % prev
+            prev = json.dumps(row)
+        if prev is not None:
+            yield '    %s' % prev
+        yield ']'
+    else:
+        raise ValueError('unknown output format: %s' % to)
+
+
+def iter_convert(src, from_, to='rst', header=None, table=None, cache=None,
+                 **options):
+    """convert tables of src, line by line
+
+    table: index of table to convert, default all tables
+    cache: ParseCache
+    options: see render_rows
+    """
+    yield from render_tables(
+        select_tables(src, from_, table, cache), to, header, **options)
+
+
+def select_tables(src, from_, table=None, cache=None):
+    """yield (rows, header) of tables of src, table is index of one table
+
+    raise ValueError if src has no table of index table
+    """
+    count = 0
+    for index, item in enumerate(read_tables(src, from_, cache)):
+        count += 1
+        if table is None or index == table:
+            yield item
+    if table is not None and not 0 <= table < count:
+        raise ValueError('no table %s, found %s tables' % (table, count))
+
+
+def render_tables(tables, to='rst', header=None, **options):
+    """render (rows, header) of tables, line by line
+
+    Tables are separated by a blank line, json of several tables is one
+    array of tables.
+    header: header rows instead of the header of tables
+    options: see render_rows
+    """
+    tables = list(tables)
+    if to == 'json' and len(tables) > 1:
+        yield '['
+        for index, (rows, head) in enumerate(tables):
+            for line in render_rows(
+                    rows, to, header=head if header is None else header, **options):
+                if line == ']' and index < len(tables) - 1:
+                    line += ','
+                yield '    ' + line
+        yield ']'
+        return
+    for index, (rows, head) in enumerate(tables):
+        if index > 0:
+            yield ''
+        yield from render_rows(
+            rows, to, header=head if header is None else header, **options)
+
+
+def convert(src, from_, to='rst', header=None, table=None, cache=None,
+            **options):
+    """convert tables of src and return text
+    """
+    lines = list(iter_convert(src, from_, to, header, table, cache, **options))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def guess_format(filename):
+    """guess input format from file extension, None if unknown
+    """
+    return Extensions.get(os.path.splitext(filename)[1].lower())
+
+
+ConvertResult = collections.namedtuple(
+    'ConvertResult', ['path', 'output', 'error', 'elapsed'])
+
+
+def _output_filenames(paths, output_dir, to):
+    """output filename of each path, keep directories relative to the
+    common directory of paths and the extension of path, page.md is
+    written to page.md.rst
+    """
+    dirnames = [os.path.dirname(os.path.abspath(path)) for path in paths]
+    top = os.path.commonpath(dirnames) if dirnames else ''
+    filenames = []
+    for path, dirname in zip(paths, dirnames):
+        name = os.path.basename(path)
+        filenames.append(os.path.normpath(os.path.join(
+            output_dir, os.path.relpath(dirname, top), '%s.%s' % (name, to))))
+    return filenames
+
+
+def _convert_file(path, from_, to, encoding, filename, options):
+    start = time.perf_counter()
+    try:
+        from_ = from_ or guess_format(path)
+        if from_ is None:
+            raise ValueError('could not guess format of "%s"' % path)
+        with open(path, 'rt', encoding=encoding, newline='') as f:
+            output = convert(f, from_, to, **options)
+        if filename:
+            os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(output)
+            output = filename
+        error = None
+    except Exception as err:
+        output = None
+        error = '%s: %s' % (err.__class__.__name__, err)
+    return ConvertResult(path, output, error, time.perf_counter() - start)
+
+
+def convert_many(paths, from_=None, to='rst', workers=None, encoding='utf-8',
+                 output_dir=None, **options):
+    """convert files with a pool of worker processes
+
+    return list of ConvertResult(path, output, error, elapsed) in the order
+    of paths. output is the converted text, or the written filename when
+    output_dir is given. Output files keep the directories of paths under
+    their common directory and the input extension, page.md and page.html
+    are written to page.md.rst and page.html.rst. A failed file has output None and the error
+    message, other files are not affected. A file whose output filename is
+    taken by an earlier path fails without converting.
+    workers: number of processes, default cpu count. 1 converts in this
+    process.
+    options: see convert
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if output_dir:
+        filenames = _output_filenames(paths, output_dir, to)
+    else:
+        filenames = [None] * len(paths)
+    results = [None] * len(paths)
+    targets = {}
+    args = []
+    for index, (path, filename) in enumerate(zip(paths, filenames)):
+        if filename is not None:
+            if filename in targets:
+                results[index] = ConvertResult(
+                    path, None, 'ValueError: output "%s" is used by "%s"' % (
+                        filename, targets[filename]), 0.0)
+                continue
+            targets[filename] = path
+        args.append((index, (path, from_, to, encoding, filename, options)))
+    if workers == 1 or len(args) < 2:
+        converted = [_convert_file(*arg) for _, arg in args]
+    else:
+        chunksize = max(1, len(args) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            converted = list(executor.map(
+                _convert_file, *zip(*[arg for _, arg in args]), chunksize=chunksize))
+    for (index, _), result in zip(args, converted):
+        results[index] = result
+    return results
+
+
+def _json_tables(text):
+    """list of tables in json output of convert
+    """
+    data = json.loads(text)
+    # one table is a list of rows, several tables a list of lists of rows
+    if any(isinstance(value, list) for row in data for value in row):
+        return data
+    return [data]
+
+
+def _split_option(value, convert_func=str):
+    if value is None:
+        return None
+    items = [convert_func(v.strip()) for v in value.split(',')]
+    return items[0] if len(items) == 1 else items
+
+
+def main(argv=None):
+    try:
+        return _main(argv)
+    except BrokenPipeError:
+        # reader of output is closed, e.g. head
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    except (ValueError, OSError) as err:
+        sys.stdout.flush()
+        sys.stderr.write('mtable: %s\n' % err)
+        return 1
+
+
+def _main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='mtable',
+        description='convert tables between %s' % ', '.join(Writers))
+    parser.add_argument('-f', '--from', dest='from_', choices=Readers,
+                        help='input format, default guess from file extension')
+    parser.add_argument('-t', '--to', choices=Writers, default='rst',
+                        help='output format, default rst')
+    parser.add_argument('--header', type=int,
+                        help='number of header rows')
+    parser.add_argument('--align',
+                        help='left, center or right, comma separated for each column')
+    parser.add_argument('--width',
+                        help='fixed column widths, comma separated for each column. '
+                        'Rows are streamed without measuring the whole table')
+    parser.add_argument('--sample', type=int,
+                        help='measure column widths from header and first SAMPLE rows')
+    parser.add_argument('--overflow', choices=OverflowPolicy, default='overflow',
+                        help='cells wider than column with --sample or --width: '
+                        'overflow, truncate or widen. default overflow')
+    parser.add_argument('--table', type=int,
+                        help='convert N-th table only, start from 0')
+    parser.add_argument('--grid', action='store_true',
+                        help='grid table for txt and rst')
+    parser.add_argument('--full', action='store_true',
+                        help='full html document')
+    parser.add_argument('--encoding', default='utf-8',
+                        help='input encoding, default utf-8')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='convert files with N worker processes')
+    parser.add_argument('-o', '--output-dir',
+                        help='write each file to OUTPUT_DIR/FILENAME.FORMAT')
+    parser.add_argument('--cache-dir',
+                        help='cache parsed md, rst and html tables in CACHE_DIR')
+    parser.add_argument('files', nargs='*', help='input files, default stdin')
+    args = parser.parse_args(argv)
+
+    options = {
+        'header': args.header,
+        'table': args.table,
+        'widths': _split_option(args.width, int),
+        'align': _split_option(args.align),
+        'simple': not args.grid,
+        'full': args.full,
+        'cache': ParseCache(path=args.cache_dir) if args.cache_dir else None,
+        'sample': args.sample,
+        'overflow': args.overflow,
+    }
+    if args.jobs or args.output_dir:
+        if not args.files:
+            parser.error('--jobs and --output-dir need input files')
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        results = convert_many(
+            args.files, args.from_, args.to, workers=args.jobs,
+            encoding=args.encoding, output_dir=args.output_dir, **options)
+        failed = 0
+        outputs = []
+        for result in results:
+            if result.error:
+                failed += 1
+                sys.stderr.write('%s: %s\n' % (result.path, result.error))
+            elif args.output_dir:
+                sys.stderr.write('%s -> %s (%.3fs)\n' % (
+                    result.path, result.output, result.elapsed))
+            elif result.output:
+                outputs.append(result.output)
+        if args.to == 'json':
+            # tables of all files in one json
+            tables = [(rows, 0) for output in outputs
+                      for rows in _json_tables(output)]
+            lines = render_tables(tables, 'json')
+            outputs = ['\n'.join(lines) + '\n'] if tables else []
+        sys.stdout.write('\n'.join(outputs))
+        sys.stdout.flush()
+        return 1 if failed else 0
+
+    stats = {}
+    options['stats'] = stats
+
+    def open_input(filename):
+        from_ = args.from_
+        if from_ is None:
+            from_ = guess_format(filename)
+            if from_ is None:
+                parser.error('could not guess format of "%s", use --from' % filename)
+        if filename == '-':
+            fobj = io.TextIOWrapper(
+                sys.stdin.buffer, encoding=args.encoding, newline='')
+        else:
+            fobj = open(filename, 'rt', encoding=args.encoding, newline='')
+        return fobj, from_
+
+    if args.to == 'json':
+        # tables of all files in one json
+        header = options.pop('header')
+        table = options.pop('table')
+        cache = options.pop('cache')
+        with contextlib.ExitStack() as stack:
+            tables = []
+            for filename in args.files or ['-']:
+                fobj, from_ = open_input(filename)
+                stack.enter_context(fobj)
+                tables.extend(select_tables(fobj, from_, table, cache))
+            for line in render_tables(tables, 'json', header, **options):
+                sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+        return 0
+
+    wrote = False
+    for filename in args.files or ['-']:
+        fobj, from_ = open_input(filename)
+        with fobj:
+            for index, line in enumerate(
+                    iter_convert(fobj, from_, args.to, **options)):
+                if index == 0 and wrote:
+                    sys.stdout.write('\n')
+                sys.stdout.write(line + '\n')
+                wrote = True
+    sys.stdout.flush()
+    if stats.get('overflow'):
+        sys.stderr.write('%s cells overflowed\n' % stats['overflow'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -34,4 +34,9 @@ setup(
     python_requires='>=3',
     py_modules=['mtable'],
     install_requires=requirements,
+    entry_points={
+        'console_scripts': [
+            'mtable = mtable:main',
+        ],
+    },
 )
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
 # -*- encoding:utf-8 -*-
 
+import contextlib
+import io
+import json
+import os
 import sys
+import tempfile
+import threading
 import urllib.request
 import chardet
 import mtable
@@ -164,10 +170,292 @@ from md
         print(table.to_rst())
 
 
+def test_convert():
+    print('''
+convert md to rst
+-----------------''')
+    with open('test.md', encoding='utf-8') as f:
+        text = f.read()
+    table = mtable.MarkupTable.from_md(text)[0]
+    assert mtable.convert(text, 'md', 'rst') == table.to_rst()
+    print(mtable.convert(text, 'md', 'rst', simple=False))
+
+    print('''
+stream csv with fixed widths
+----------------------------''')
+    csv_text = '\n'.join(','.join(str(v) for v in row) for row in data)
+    print(mtable.convert(csv_text, 'csv', 'md', widths=16, align='right'))
+
+    for widths in ([16, 16], None):
+        try:
+            mtable.convert(csv_text + '\n1,2,3,4,5', 'csv', 'md', widths=widths)
+        except ValueError as err:
+            print(err)
+        else:
+            assert widths is None
+
+    # short rows are padded with null_char
+    assert mtable.convert('a,b\n1\n', 'csv', 'rst').splitlines()[3] == ' 1   --  '
+    assert mtable.convert('a\n1,2,3\n', 'csv', 'rst').splitlines()[0] == '=== ==== ==== '
+    stats = {}
+    mtable.convert('a,b\n1,2\n3\n', 'csv', 'rst', sample=1, stats=stats)
+    assert stats['overflow'] == 1
+
+    try:
+        mtable.convert(text, 'md', 'rst', table=99)
+    except ValueError as err:
+        print(err)
+    else:
+        assert False
+    assert mtable.main(['not_found.md']) == 1
+
+    print('''
+convert tables to json
+----------------------''')
+    with open('test.rst', encoding='utf-8') as f:
+        text = f.read()
+    tables = json.loads(mtable.convert(text, 'rst', 'json'))
+    assert len(tables) == len(mtable.MarkupTable.from_rst(text))
+    print(tables[-1])
+
+
+def test_convert_many():
+    print('''
+convert many files
+------------------''')
+    results = mtable.convert_many(
+        ['test.md', 'test.rst', 'not_found.md'], to='md', workers=2)
+    assert [r.path for r in results] == ['test.md', 'test.rst', 'not_found.md']
+    assert results[2].output is None and results[2].error
+    for result in results:
+        print('%s: %.3fs %s' % (result.path, result.elapsed, result.error or ''))
+        if result.output:
+            print(result.output)
+
+    # same output filename
+    with tempfile.TemporaryDirectory() as path:
+        results = mtable.convert_many(
+            ['test.md', './test.md'], to='rst', output_dir=path)
+        assert results[0].output == os.path.join(path, 'test.md.rst')
+        assert results[1].output is None and results[1].error
+        results = mtable.convert_many(
+            ['test.md', 'test.rst'], to='rst', output_dir=path)
+        assert [r.output for r in results] == [
+            os.path.join(path, 'test.md.rst'), os.path.join(path, 'test.rst.rst')]
+
+    print('''
+command line with jobs
+----------------------''')
+    for to in ['rst', 'json']:
+        outputs = []
+        for jobs in [[], ['-j', '2']]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                assert mtable.main(jobs + ['-t', to, 'test.rst', 'test.md']) == 0
+            outputs.append(output.getvalue())
+        assert outputs[0] == outputs[1]
+        print(output.getvalue())
+    tables = json.loads(output.getvalue())
+    assert len(tables) == 3
+
+
+def test_parse_cache():
+    print('''
+parse cache
+-----------''')
+    with open('test.rst', encoding='utf-8') as f:
+        text = f.read()
+    cache = mtable.ParseCache()
+    tables = mtable.MarkupTable.from_rst(text, cache=cache)
+    cached_tables = mtable.MarkupTable.from_rst(text, cache=cache)
+    assert [t.to_rst() for t in tables] == [t.to_rst() for t in cached_tables]
+    assert cache.hits == 1 and cache.misses == 1
+    print(cache.stats())
+
+    with tempfile.TemporaryDirectory() as path:
+        cache = mtable.ParseCache(path=path)
+        mtable.MarkupTable.from_rst(text, cache=cache)
+        key = cache.make_key('rst', text)
+        value = cache.get(key)
+        assert value is not None
+        cache.set(key, value)
+        disk_bytes = sum(os.path.getsize(os.path.join(path, name))
+                         for name in os.listdir(path))
+        assert cache.stats()['disk_bytes'] == disk_bytes
+        cached_tables = mtable.MarkupTable.from_rst(
+            text, cache=mtable.ParseCache(path=path))
+        assert [t.to_rst() for t in tables] == [t.to_rst() for t in cached_tables]
+
+        # broken file is removed
+        cache = mtable.ParseCache(path=path)
+        with open(os.path.join(path, 'broken.json'), 'w') as f:
+            f.write('[')
+        assert cache.stats()['disk_bytes'] == disk_bytes + 1
+        assert cache.get('broken') is None
+        assert cache.stats()['disk_bytes'] == disk_bytes
+
+
+def test_freeze():
+    print('''
+frozen table rendered by threads
+--------------------------------''')
+    rows = data + [['%s' % i, '中文' * (i % 7), i * 1.5, None] for i in range(200)]
+    table = mtable.MarkupTable(rows, header=1)
+    table.set_align('right', columns=[2])
+    frozen = table.freeze()
+    expected = {'md': table.to_md(), 'txt': table.to_txt()}
+    errors = []
+
+    def render(fmt):
+        for _ in range(50):
+            if getattr(frozen, 'to_%s' % fmt)() != expected[fmt]:
+                errors.append(fmt)
+
+    threads = [threading.Thread(target=render, args=(fmt,))
+               for fmt in ['md', 'txt'] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    try:
+        frozen.set_align('left')
+    except TypeError as err:
+        print(frozen, err)
+
+
+def test_stack():
+    print('''
+vstack, hstack and join
+-----------------------''')
+    table = mtable.MarkupTable(data, header=1)
+    more = mtable.MarkupTable([data[0], ['搜狐', 'www.sohu.com', '新闻', 5]], header=1)
+    rows = mtable.MarkupTable.vstack([table, more])
+    assert rows.row_count() == 6
+    assert rows._data[1] is table._data[1]
+    print(rows.to_rst())
+
+    notes = mtable.MarkupTable([['名字', '年份'], ['百度', 2000], ['腾讯', 1998]], header=1)
+    print(mtable.MarkupTable.hstack([table, notes]).to_rst())
+    print(table.join(notes, on='名字', how='left').to_rst())
+
+    frozen = mtable.MarkupTable.vstack([table.freeze(), more.freeze()])
+    assert frozen.to_rst() == rows.to_rst()
+
+    # format rules move with rows and columns
+    more.set_format(lambda x: '<%s>' % x, rows=1, columns=3)
+    notes.set_format(lambda x: '%s 年' % x, columns=1)
+    assert mtable.MarkupTable.vstack([table, more]).render_data(5, 3) == '<5>'
+    assert mtable.MarkupTable.hstack([table, notes]).render_data(1, 5) == '2000 年'
+    assert table.join(notes, on='名字').render_data(1, 4) == '2000 年'
+
+
+def test_encode():
+    print('''
+encode low cardinality columns
+------------------------------''')
+    rows = data + [['百度', 'www.baidu.com', '搜索', i] for i in range(20)]
+    table = mtable.MarkupTable(rows, header=1)
+    expected = table.to_rst()
+    assert table.encode(0.5) == [0, 1, 2]
+    assert table.get_cell(5, 1) is table.get_cell(6, 1)
+    assert table.to_rst() == expected
+    values = mtable.MarkupTable([['值'], [1], [1.0], [True], [1]], header=1)
+    values.encode(0.9)
+    assert [row[0] for row in values.to_list()[1:]] == [1, 1.0, True, 1]
+    assert '| True |' in values.to_md()
+    try:
+        values.freeze().encode(0.9)
+    except TypeError as err:
+        print(err)
+    else:
+        assert False
+
+    # cells are shared while reading csv
+    text = '\n'.join(','.join(str(v) for v in row) for row in rows)
+    read = mtable.MarkupTable.from_csv(io.StringIO(text), encode=0.5)
+    assert sorted(read._shared_columns) == [0, 1, 2]
+    assert read.get_cell(5, 1) is read.get_cell(6, 1)
+    assert read.get_cell(5, 3) is not read.get_cell(6, 3)
+    plain = mtable.MarkupTable.from_csv(io.StringIO(text))
+    assert read.to_rst() == plain.to_rst()
+    read = mtable.MarkupTable()
+    read._append_encoded(rows[1:], 0.5, window=3)
+    assert not read._shared_columns
+
+    table.set_align('right', rows=[5], columns=[1])
+    lines = table.to_rst().split('\n')
+    assert lines[7].startswith(' 百度     www.baidu.com ')
+    assert lines[8].startswith(' 百度   www.baidu.com ')
+    print('\n'.join(lines))
+
+
+def test_estimate_widths():
+    print('''
+estimate widths from sample rows
+--------------------------------''')
+    rows = data + [['搜狐', 'www.sohu.com', '新闻，搜索，输入法，视频，邮箱', 5]]
+    table = mtable.MarkupTable(rows, header=1)
+    table.estimate_widths(sample=2, reservoir=0, overflow='truncate')
+    print(table.to_rst())
+    assert table.overflow_count() == 2
+    table.estimate_widths(sample=2, reservoir=0, overflow='widen')
+    assert table.to_rst() == mtable.MarkupTable(rows, header=1).to_rst()
+    assert table.overflow_count() == 2
+
+    stats = {}
+    lines = mtable.render_rows(
+        rows, 'md', header=1, sample=2, overflow='widen', stats=stats)
+    print('\n'.join(lines))
+    assert stats['overflow'] == 2
+
+
+def test_rules():
+    print('''
+format rules
+------------''')
+    table = mtable.MarkupTable(data, header=1)
+    table.set_format(lambda x: '{:,.2f}'.format(float(x)), rows=range(1, 3), columns=3)
+    table.add_rule(align='right', style='color:red', columns=3,
+                   when=lambda x: float(x) < 0)
+    table.append_row(['搜狐', 'www.sohu.com', '新闻', -5])
+    print(table.to_rst())
+    assert table.render_cell(1, 3) == '4.00  '
+    assert table.render_cell(5, 3) == '    -5'
+    assert table._html_cell('td', 5, 3) == '<td style="color:red">-5</td>'
+    assert table.freeze().to_rst() == table.to_rst()
+
+    table.set_align('right', rows=-1, columns=-2)
+    assert '            新闻 ' in table.to_rst().split('\n')[-3]
+    try:
+        table.set_align('right', rows=10)
+    except IndexError as err:
+        print(err)
+    else:
+        assert False
+
+    # shared cells render by rules of each table
+    rows = [['id', 'value']] + [[i, 'x'] for i in range(10)]
+    encoded = mtable.MarkupTable(rows, header=1)
+    encoded.encode(0.5)
+    stacked = mtable.MarkupTable.vstack([encoded])
+    encoded.set_align('right', columns=[1])
+    stacked.set_align('center', columns=[1])
+    assert encoded.to_rst().split('\n')[3] != stacked.to_rst().split('\n')[3]
+
+
 if __name__ == '__main__':
     test_text()
     test_rst()
     test_md()
+    test_convert()
+    test_convert_many()
+    test_parse_cache()
+    test_freeze()
+    test_stack()
+    test_encode()
+    test_estimate_widths()
+    test_rules()
     # test_html()
     # test_csv()
     # test_json()